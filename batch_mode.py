@@ -0,0 +1,125 @@
+import asyncio
+import json
+from pathlib import Path
+from openai import AsyncOpenAI
+from ticket_schema import SINGLE_PASS_PROMPT, TicketOut, feedback_message
+
+
+MODEL = "gpt-4o-mini"
+POLL_INTERVAL = 30  # seconds between batch status checks
+
+# Batch API limits per input file, with some headroom on the size
+MAX_BATCH_REQUESTS = 50_000
+MAX_BATCH_BYTES = 190 * 1024 * 1024
+
+# Strict structured-output schema, generated from the same model the live path uses
+TICKET_SCHEMA = TicketOut.model_json_schema()
+
+
+def build_request(custom_id, item):
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": MODEL,
+            "messages": [
+                {"role": "system", "content": SINGLE_PASS_PROMPT},
+                {"role": "user", "content": feedback_message(item['id'], item['type'], item['text'])}
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "ticket", "strict": True, "schema": TICKET_SCHEMA}
+            }
+        }
+    }
+
+
+def write_batch_files(items, work_dir):
+    # Split the requests into input files that each stay under the Batch API
+    # limits. custom_ids stay global, so results can be merged back by index.
+    paths = []
+    f, count, size = None, 0, 0
+    try:
+        for i, item in enumerate(items):
+            line = (json.dumps(build_request(f"item-{i}", item)) + "\n").encode("utf-8")
+            if f is None or count == MAX_BATCH_REQUESTS or size + len(line) > MAX_BATCH_BYTES:
+                if f is not None:
+                    f.close()
+                paths.append(Path(work_dir) / f"batch_input_{len(paths)}.jsonl")
+                f, count, size = open(paths[-1], "wb"), 0, 0
+            f.write(line)
+            count += 1
+            size += len(line)
+    finally:
+        if f is not None:
+            f.close()
+    return paths
+
+
+def parse_batch_output(text, results):
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        if row.get("error") or response.get("status_code") != 200:
+            print(f" Batch request {row.get('custom_id')} failed: {row.get('error')}")
+            continue
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+            index = int(row["custom_id"].split("-", 1)[1])
+            results[index] = json.loads(content)
+        except (KeyError, IndexError, ValueError) as e:
+            print(f" Could not parse batch result {row.get('custom_id')}: {e}")
+
+
+# BATCH EXECUTION
+async def run_one_batch(client, input_path, results):
+    with open(input_path, "rb") as f:
+        batch_file = await client.files.create(file=f, purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f" Submitted batch {batch.id} from {input_path.name}.")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total})" if counts else ""
+        print(f" Batch {batch.id}: {batch.status}{progress}")
+
+    # Expired or cancelled batches can still carry partial results
+    if batch.output_file_id:
+        output = await client.files.content(batch.output_file_id)
+        parse_batch_output(output.text, results)
+    else:
+        print(f" Batch {batch.id} finished with status '{batch.status}' and no output.")
+
+
+# Returns one ticket per item (same order), or None where the request failed
+async def run_batch(items, work_dir):
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    input_paths = write_batch_files(items, work_dir)
+    print(f" Sending {len(items)} requests in {len(input_paths)} batch(es).")
+
+    client = AsyncOpenAI()
+    try:
+        # A rejected or failed batch only loses its own items
+        outcomes = await asyncio.gather(
+            *(run_one_batch(client, path, results) for path in input_paths),
+            return_exceptions=True
+        )
+        for path, outcome in zip(input_paths, outcomes):
+            if isinstance(outcome, Exception):
+                print(f" Batch from {path.name} failed: {outcome}")
+    finally:
+        await client.close()
+
+    return results
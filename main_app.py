@@ -1,32 +1,103 @@
+import argparse
 import asyncio
 import os
 import json
 import csv
 import time
+import shutil
+import hashlib
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ValidationError
 from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.messages import StructuredMessage, TextMessage
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_ext.models.openai import OpenAIChatCompletionClient
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from aiolimiter import AsyncLimiter
+from autogen_core.models import SystemMessage, UserMessage
+from batch_mode import run_batch
+from ticket_schema import SINGLE_PASS_PROMPT, Category, Priority, TicketOut, feedback_message
 
 
 DATA_DIR = Path("data")
 OUTPUT_DIR = Path("outputs")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Max number of feedback items processed concurrently
+MAX_CONCURRENCY = 10
+
+# Ticket cache: skip the agents for feedback we have already seen
+TICKET_CACHE_PATH = OUTPUT_DIR / "ticket_cache.json"
+EMBEDDING_CACHE_PATH = OUTPUT_DIR / "ticket_cache_embeddings.npz"  # only used with --semantic-cache
+CACHE_VERSION = 1  # bump when the prompts or TicketOut change to drop old entries
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BATCH_SIZE = 2048  # max inputs per embeddings request
+SIMILARITY_THRESHOLD = 0.92
+
+TICKET_FIELDS = ["ticket_id", "title", "category", "priority", "details", "source_id", "source_type"]
+
 
 # MODEL & API KEY SETUP
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
+# Requests per minute shared by every item, keep below the account's RPM limit
+REQUESTS_PER_MINUTE = 500
+rate_limiter = AsyncLimiter(max_rate=REQUESTS_PER_MINUTE, time_period=60)
+
+
+class RetryingChatCompletionClient(OpenAIChatCompletionClient):
+    # Back off and retry on 429s and transient server errors instead of
+    # throwing away the agent turns already completed for the item.
+    @retry(
+        wait=wait_random_exponential(min=1, max=60),
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+        reraise=True
+    )
+    async def create(self, *args, **kwargs):
+        async with rate_limiter:
+            return await super().create(*args, **kwargs)
+
+    async def create_stream(self, *args, **kwargs):
+        # Streams can't be replayed safely, so they are only rate limited
+        async with rate_limiter:
+            pass
+        async for chunk in super().create_stream(*args, **kwargs):
+            yield chunk
+
+
 def get_model_client():
-    return OpenAIChatCompletionClient(
+    return RetryingChatCompletionClient(
         model="gpt-4o-mini", 
     )
 
 
+# OUTPUT SCHEMAS
+# Passed to the agents as output_content_type, so the API returns JSON that
+# already matches the schema (OpenAI structured outputs). The final TicketOut
+# schema lives in ticket_schema.py, shared with the batch job.
+class ClassifierOut(BaseModel):
+    category: Category
+    priority: Priority
+
+class BugOut(BaseModel):
+    steps_to_reproduce: List[str]
+    device_info: Optional[str]
+    severity: str
+
+class FeatureOut(BaseModel):
+    requested_feature: str
+    user_impact: Literal["High", "Med", "Low"]
+
+
 # AGENT DEFINITIONS
 async def get_agent_team(model_client):
     # 1. Feedback Classifier
@@ -36,8 +107,8 @@ async def get_agent_team(model_client):
         system_message="""You are an expert Feedback Classifier.
         Your ONLY job is to categorize the input text into ONE of: 
         [Bug, Feature Request, Praise, Complaint, Spam].
-        Also assign a Priority: [Critical, High, Medium, Low].
-        Output strictly JSON: {"category": "...", "priority": "..."}"""
+        Also assign a Priority: [Critical, High, Medium, Low].""",
+        output_content_type=ClassifierOut
     )
 
     # 2. Bug Analyst
@@ -45,12 +116,11 @@ async def get_agent_team(model_client):
         name="Bug_Analyst",
         model_client=model_client,
         system_message="""You are a QA Engineer. 
-        IF the category is 'Bug':
+        For this Bug report:
         - Extract 'steps_to_reproduce' (list)
         - Identify 'device_info' (if present)
-        - Estimate 'severity'
-        IF NOT a Bug, return {"status": "skipped"}.
-        Output strictly JSON."""
+        - Estimate 'severity'""",
+        output_content_type=BugOut
     )
 
     # 3. Feature Extractor
@@ -58,11 +128,10 @@ async def get_agent_team(model_client):
         name="Feature_Extractor",
         model_client=model_client,
         system_message="""You are a Product Manager.
-        IF the category is 'Feature Request':
+        For this Feature Request:
         - Extract 'requested_feature' (concise description)
-        - Estimate 'user_impact' (High/Med/Low)
-        IF NOT a Feature Request, return {"status": "skipped"}.
-        Output strictly JSON."""
+        - Estimate 'user_impact' (High/Med/Low)""",
+        output_content_type=FeatureOut
     )
 
     # 4. Ticket Creator
@@ -71,16 +140,10 @@ async def get_agent_team(model_client):
         model_client=model_client,
         system_message="""You are a Jira Admin. 
         Compile the final ticket based on previous agent outputs.
-        Schema:
-        {
-            "title": "Title",
-            "category": "Category",
-            "priority": "Priority",
-            "details": { ...merge bug/feature details... },
-            "reasoning": "Why this priority?"
-        }
-        Return ONLY valid JSON.
-        """
+        - 'details': merge the bug/feature details, null for anything that does not apply
+        - 'reasoning': Why this priority?
+        """,
+        output_content_type=TicketOut
     )
 
     # 5. Quality Critic
@@ -91,7 +154,6 @@ async def get_agent_team(model_client):
         Check the Ticket Creator's output.
         - Is the title clear?
         - Is the priority reasonable?
-        - Is the JSON valid?
         If GOOD, reply "APPROVED".
         If BAD, explain what to fix.
         """
@@ -100,79 +162,447 @@ async def get_agent_team(model_client):
     return [classifier, bug_analyst, feature_extractor, ticket_creator, quality_critic]
 
 
+# TICKET CACHE
+ticket_cache = {}       # text hash -> {"pipeline", "version", "ticket"}
+embedding_cache = {}    # text hash -> embedding vector
+
+def cache_key(text):
+    return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+def load_ticket_cache():
+    if not TICKET_CACHE_PATH.exists():
+        return
+    try:
+        with open(TICKET_CACHE_PATH, "r") as f:
+            data = json.load(f)
+        entries = data.get("tickets", {})
+        current = {
+            key: entry for key, entry in entries.items()
+            if isinstance(entry, dict) and entry.get("version") == CACHE_VERSION
+        }
+        ticket_cache.update(current)
+        print(f" Loaded {len(current)} cached tickets ({len(entries) - len(current)} outdated entries dropped).")
+    except Exception as e:
+        print(f" Warning: could not read ticket cache: {e}")
+
+def save_ticket_cache():
+    with open(TICKET_CACHE_PATH, "w") as f:
+        json.dump({"tickets": ticket_cache}, f)
+
+# Embeddings live in a binary sidecar so runs without the semantic tier
+# never have to parse or rewrite them.
+def load_embedding_cache():
+    if not EMBEDDING_CACHE_PATH.exists():
+        return
+    try:
+        with np.load(EMBEDDING_CACHE_PATH) as data:
+            embedding_cache.update(zip(data["keys"].tolist(), data["vectors"]))
+    except Exception as e:
+        print(f" Warning: could not read embedding cache: {e}")
+
+def save_embedding_cache():
+    if not embedding_cache:
+        return
+    keys = list(embedding_cache)
+    np.savez(
+        EMBEDDING_CACHE_PATH,
+        keys=np.array(keys),
+        vectors=np.stack([embedding_cache[k] for k in keys])
+    )
+
+async def embed_items(items):
+    # Embed every text we haven't seen before, in as few API calls as allowed
+    missing = {}
+    for item in items:
+        key = cache_key(item["text"])
+        if key not in embedding_cache:
+            missing[key] = item["text"]
+    if not missing:
+        return
+
+    keys = list(missing)
+    client = AsyncOpenAI()
+    try:
+        for start in range(0, len(keys), EMBEDDING_BATCH_SIZE):
+            chunk = keys[start:start + EMBEDDING_BATCH_SIZE]
+            response = await client.embeddings.create(model=EMBEDDING_MODEL, input=[missing[k] for k in chunk])
+            for key, data in zip(chunk, response.data):
+                embedding_cache[key] = np.asarray(data.embedding, dtype=np.float32)
+    finally:
+        await client.close()
+
+
+class SemanticIndex:
+    # Normalized embeddings of the cached tickets in one preallocated matrix,
+    # so a lookup is a single matrix-vector product instead of a rebuild.
+    def __init__(self):
+        self.enabled = False
+        self.keys = []
+        self.indexed = set()
+        self.matrix = None
+
+    def add(self, key, vector):
+        if not self.enabled or key in self.indexed:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.matrix is None or len(self.keys) == len(self.matrix):
+            grown = np.empty((max(1024, 2 * len(self.keys)), len(vector)), dtype=np.float32)
+            if self.matrix is not None:
+                grown[:len(self.keys)] = self.matrix
+            self.matrix = grown
+        self.matrix[len(self.keys)] = vector / np.linalg.norm(vector)
+        self.keys.append(key)
+        self.indexed.add(key)
+
+    def search(self, vector):
+        # Returns the closest key and its cosine similarity
+        if not self.keys:
+            return None, 0.0
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self.matrix[:len(self.keys)] @ (query / np.linalg.norm(query))
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+# One index per pipeline, so --quality runs only match quality tickets
+semantic_indexes = {"fast": SemanticIndex(), "quality": SemanticIndex()}
+
+def enable_semantic_cache():
+    for index in semantic_indexes.values():
+        index.enabled = True
+    for key, entry in ticket_cache.items():
+        if key in embedding_cache:
+            semantic_indexes[entry["pipeline"]].add(key, embedding_cache[key])
+
+def usable(entry, quality):
+    # Quality runs only reuse tickets from the agent team, fast runs reuse either
+    return entry is not None and (entry["pipeline"] == "quality" or not quality)
+
+def store_entry(key, entry):
+    ticket_cache[key] = entry
+    if key in embedding_cache:
+        semantic_indexes[entry["pipeline"]].add(key, embedding_cache[key])
+
+def cache_ticket(key, ticket, pipeline):
+    store_entry(key, {"pipeline": pipeline, "version": CACHE_VERSION, "ticket": ticket})
+
+def find_similar_ticket(key, quality):
+    vector = embedding_cache.get(key)
+    if vector is None:
+        return None
+    pipelines = ["quality"] if quality else ["fast", "quality"]
+    match, score = max(
+        (semantic_indexes[p].search(vector) for p in pipelines),
+        key=lambda found: found[1]
+    )
+    if match is None or score < SIMILARITY_THRESHOLD:
+        return None
+    print(f" Warning: reusing the ticket of a near-duplicate (similarity {score:.3f}); "
+          "its title and details come from the other feedback.")
+    return ticket_cache[match]["ticket"]
+
+def lookup_ticket(text, quality=False):
+    key = cache_key(text)
+    entry = ticket_cache.get(key)
+    if usable(entry, quality):
+        return entry["ticket"]
+    return find_similar_ticket(key, quality)
+
+
 # PIPELINE LOGIC
-async def process_single_item(row_id, source_type, text):
-    model_client = get_model_client()
-    agents = await get_agent_team(model_client)
-    
-    # Termination: Stop when Critic says "APPROVED"
-    termination = TextMentionTermination("APPROVED")
-
-    # Round Robin Team
-    team = RoundRobinGroupChat(
-        participants=agents, 
-        termination_condition=termination,
-        max_turns=6
+def error_ticket(row_id, reason):
+    return {
+        "title": f"Error Processing {row_id}",
+        "category": "Error",
+        "priority": "Low",
+        "details": {"error": reason}
+    }
+
+
+async def process_single_item(row_id, source_type, text, model_client, sem, quality=False):
+    cached = lookup_ticket(text, quality)
+    if cached is not None:
+        print(f" Cache hit for {source_type} {row_id}.")
+        return cached
+
+    # Limit how many items hit the API at the same time
+    async with sem:
+        # Look again: items queued behind the semaphore can reuse tickets
+        # cached earlier in this same run
+        cached = lookup_ticket(text, quality)
+        if cached is not None:
+            print(f" Cache hit for {source_type} {row_id}.")
+            return cached
+
+        print(f" Processing {source_type} {row_id}...")
+        if quality:
+            result = await run_agent_team(row_id, text, model_client)
+        else:
+            result = await run_single_call(row_id, source_type, text, model_client)
+
+    if result.get("category") != "Error":
+        cache_ticket(cache_key(text), result, "quality" if quality else "fast")
+    return result
+
+
+async def run_single_call(row_id, source_type, text, model_client):
+    # Default path: one structured-output request does the whole pipeline
+    result = await model_client.create(
+        messages=[
+            SystemMessage(content=SINGLE_PASS_PROMPT),
+            UserMessage(content=feedback_message(row_id, source_type, text), source="user")
+        ],
+        json_output=TicketOut
     )
+    return TicketOut.model_validate_json(result.content).model_dump(exclude_none=True)
+
+
+async def run_agent_team(row_id, text, model_client):
+    # Agents keep their own chat history, so each item gets a fresh set,
+    # but they all share one model client (and its HTTP connection pool).
+    classifier, bug_analyst, feature_extractor, ticket_creator, quality_critic = await get_agent_team(model_client)
 
     task_msg = f"""
     PROCESS THIS FEEDBACK (ID: {row_id}): "{text}"
     
     Pipeline:
     1. Classifier: Categorize.
-    2. Bug_Analyst & Feature_Extractor: Extract details.
-    3. Ticket_Creator: Draft JSON.
+    2. Bug_Analyst / Feature_Extractor (only when relevant): Extract details.
+    3. Ticket_Creator: Draft the ticket.
     4. Quality_Critic: Review.
-    
-    Ticket_Creator: Output final JSON before approval.
     """
 
     final_json = {}
     
     try:
-        result_stream = team.run_stream(task=task_msg)
+        # 1. Classify first, so only the relevant specialists join the team
+        task = TextMessage(content=task_msg, source="user")
+        classification = await classifier.run(task=task)
+        classifier_msg = classification.messages[-1]
+        category = classifier_msg.content.category
+
+        participants = []
+        if category == "Bug":
+            participants.append(bug_analyst)
+        if category == "Feature Request":
+            participants.append(feature_extractor)
+        participants += [ticket_creator, quality_critic]
+
+        # Termination: Stop when Critic says "APPROVED"
+        termination = TextMentionTermination("APPROVED")
+
+        # Round Robin Team over the remaining agents
+        team = RoundRobinGroupChat(
+            participants=participants, 
+            termination_condition=termination,
+            max_turns=len(participants)
+        )
+
+        # The team only accepts registered message types, so forward the
+        # structured classification as plain text
+        classification_text = TextMessage(content=classifier_msg.to_model_text(), source=classifier_msg.source)
+        result_stream = team.run_stream(task=[task, classification_text])
         async for message in result_stream:
-            if hasattr(message, "content") and isinstance(message.content, str):
-                # Attempt to grab the last valid JSON from the stream
-                if "{" in message.content and "title" in message.content:
-                    try:
-                        start = message.content.find("{")
-                        end = message.content.rfind("}") + 1
-                        snippet = message.content[start:end]
-                        data = json.loads(snippet)
-                        if "title" in data:
-                            final_json = data
-                    except:
-                        pass
+            # The Ticket_Creator's reply is already a parsed TicketOut
+            if isinstance(message, StructuredMessage) and message.source == "Ticket_Creator":
+                final_json = message.content.model_dump(exclude_none=True)
     except Exception as e:
         print(f" Error processing {row_id}: {e}")
 
     # Default if agents fail
     if not final_json:
-        return {
-            "title": f"Error Processing {row_id}",
-            "category": "Error",
-            "priority": "Low",
-            "details": {"error": "Agents did not produce valid JSON"}
-        }
+        return error_ticket(row_id, "Agents did not produce a ticket")
         
     return final_json
 
 
+async def process_group(group, model_client, sem, quality):
+    # All items in a group share the same text, so only the first one is processed
+    first = group[0]
+    try:
+        result = await process_single_item(first['id'], first['type'], first['text'], model_client, sem, quality)
+    except Exception as e:
+        print(f" Error processing {first['id']}: {e}")
+        result = error_ticket(first['id'], str(e))
+    return group, result
+
+
+def build_ticket(item, result):
+    return {
+        "ticket_id": f"TKT-{item['id']}",
+        "title": result.get("title", "Untitled"),
+        "category": result.get("category", "Uncategorized"),
+        "priority": result.get("priority", "Low"),
+        "details": result.get("details", {}),
+        "source_id": item['id'],
+        "source_type": item['type']
+    }
+
+
+def csv_row(ticket):
+    # The CSV is a flat export, so details goes in as JSON text there;
+    # the .jsonl and .parquet outputs keep it structured.
+    return {**ticket, "details": json.dumps(ticket["details"])}
+
+
+async def process_groups_batch(groups):
+    # Cached items are answered locally, everything else goes into one batch job
+    done, pending = [], []
+    for group in groups:
+        cached = lookup_ticket(group[0]['text'])
+        if cached is not None:
+            done.append((group, cached))
+        else:
+            pending.append(group)
+
+    results = await run_batch([group[0] for group in pending], OUTPUT_DIR)
+    for group, result in zip(pending, results):
+        if result is None:
+            result = error_ticket(group[0]['id'], "Batch request failed")
+        else:
+            # Same shape as live tickets: validated, with null details dropped
+            try:
+                result = TicketOut.model_validate(result).model_dump(exclude_none=True)
+                cache_ticket(cache_key(group[0]['text']), result, "fast")
+            except ValidationError as e:
+                result = error_ticket(group[0]['id'], f"Invalid batch result: {e}")
+        done.append((group, result))
+    return done
+
+
+async def iter_results(groups, mode, model_client, sem, quality):
+    if mode == "batch":
+        for group, result in await process_groups_batch(groups):
+            yield group, result
+        return
+
+    tasks = [process_group(group, model_client, sem, quality) for group in groups]
+    for next_done in asyncio.as_completed(tasks):
+        yield await next_done
+
+
+def read_feedback_csv(path, columns):
+    # Headers may contain hidden spaces like " email_id", so match them stripped
+    header = pd.read_csv(path, nrows=0).columns
+    raw_names = {name.strip(): name for name in header}
+    usecols = [raw_names[c] for c in columns if c in raw_names]
+
+    # Only load the columns we need. The C engine is kept on purpose: the
+    # pyarrow engine can't parse quoted multi-line email bodies in large files.
+    df = pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype={c: "string" for c in usecols}
+    )
+    df.columns = df.columns.str.strip()
+    return df
+
+
+async def write_tickets(groups, mode, quality, path):
+    ticket_count = 0
+    model_client = get_model_client()
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    try:
+        with open(path, "w", newline="", encoding="utf-8") as f, \
+                open(path.with_suffix(".jsonl"), "w", encoding="utf-8") as jf:
+            writer = csv.DictWriter(f, fieldnames=TICKET_FIELDS)
+            writer.writeheader()
+
+            async for group, result in iter_results(groups, mode, model_client, sem, quality):
+                for item in group:
+                    ticket = build_ticket(item, result)
+                    writer.writerow(csv_row(ticket))
+                    jf.write(json.dumps(ticket) + "\n")
+                    ticket_count += 1
+                f.flush()
+                jf.flush()
+    finally:
+        await model_client.close()
+    return ticket_count
+
+
+# MULTIPROCESSING
+# For very large inputs a single process becomes CPU-bound (JSON parsing,
+# AutoGen message handling), so the groups are split across worker
+# processes, each with its own event loop, model client and shard CSV.
+def run_shard(shard_path, groups, quality, workers):
+    global rate_limiter
+    # Every worker gets an equal share of the overall request budget
+    rate_limiter = AsyncLimiter(max_rate=REQUESTS_PER_MINUTE / workers, time_period=60)
+
+    count = asyncio.run(write_tickets(groups, "live", quality, shard_path))
+
+    # Only send back the tickets this worker produced
+    keys = (cache_key(group[0]['text']) for group in groups)
+    return count, {key: ticket_cache[key] for key in keys if key in ticket_cache}
+
+
+async def run_sharded(groups, quality, workers, path):
+    # Cache hits are resolved here, so workers need no copy of the caches
+    hits, misses = [], []
+    for group in groups:
+        cached = lookup_ticket(group[0]['text'], quality)
+        if cached is not None:
+            hits.append((group, cached))
+        else:
+            misses.append(group)
+
+    shards = [misses[i::workers] for i in range(workers)]
+    shard_paths = [path.with_name(f"{path.stem}.shard{i}{path.suffix}") for i in range(workers)]
+    print(f" {len(hits)} cache hits, splitting {len(misses)} items across {workers} processes...")
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A crashed worker only loses its own shard, the others are still merged
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, run_shard, shard_path, shard, quality, workers)
+            for shard_path, shard in zip(shard_paths, shards)
+        ), return_exceptions=True)
+
+    # Write the cache hits, then append the shard outputs (minus the CSV headers)
+    ticket_count = 0
+    with open(path, "w", newline="", encoding="utf-8") as out, \
+            open(path.with_suffix(".jsonl"), "w", encoding="utf-8") as jout:
+        writer = csv.DictWriter(out, fieldnames=TICKET_FIELDS)
+        writer.writeheader()
+        for group, result in hits:
+            for item in group:
+                ticket = build_ticket(item, result)
+                writer.writerow(csv_row(ticket))
+                jout.write(json.dumps(ticket) + "\n")
+                ticket_count += 1
+
+        for i, (shard_path, result) in enumerate(zip(shard_paths, results)):
+            if isinstance(result, Exception):
+                # Its partial output has no matching cache entries, so drop it
+                print(f" Warning: shard {i} failed ({len(shards[i])} items skipped): {result}")
+            else:
+                with open(shard_path, "r", newline="", encoding="utf-8") as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out)
+                with open(shard_path.with_suffix(".jsonl"), "r", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, jout)
+                count, new_tickets = result
+                ticket_count += count
+                for key, entry in new_tickets.items():
+                    store_entry(key, entry)
+            shard_path.unlink(missing_ok=True)
+            shard_path.with_suffix(".jsonl").unlink(missing_ok=True)
+
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        print(f" {failed} of {workers} shards failed, rerun to retry their items.")
+    return ticket_count
+
+
 # MAIN EXECUTION
-async def main():
+async def main(mode="live", quality=False, workers=1, semantic_cache=False):
     print(" Starting AutoGen Feedback System...")
     
    
     try:
-        reviews = pd.read_csv(DATA_DIR / "app_store_reviews.csv")
-        emails = pd.read_csv(DATA_DIR / "support_emails.csv")
-        
-        # --- CRITICAL FIX: CLEAN COLUMN NAMES ---
-        # This removes hidden spaces like " email_id" -> "email_id"
-        reviews.columns = reviews.columns.str.strip()
-        emails.columns = emails.columns.str.strip()
-        # ----------------------------------------
+        reviews = read_feedback_csv(DATA_DIR / "app_store_reviews.csv", ["review_id", "review_text"])
+        emails = read_feedback_csv(DATA_DIR / "support_emails.csv", ["email_id", "body"])
         
         print(f" Loaded {len(reviews)} reviews and {len(emails)} emails.")
         
@@ -181,56 +611,100 @@ async def main():
         print("Please check that 'app_store_reviews.csv' and 'support_emails.csv' are in the 'data/' folder.")
         return
 
-    all_tickets = []
-    
     # 2. PREPARE ITEMS
     items = []
     
     # Process Reviews
     if 'review_id' in reviews.columns and 'review_text' in reviews.columns:
-        for _, r in reviews.iterrows():
-            items.append({"id": str(r["review_id"]), "type": "Review", "text": str(r["review_text"])})
+        items.extend(
+            {"id": rid, "type": "Review", "text": txt}
+            for rid, txt in zip(reviews["review_id"].astype(str), reviews["review_text"].astype(str))
+        )
     else:
         print(" Warning: 'app_store_reviews.csv' missing 'review_id' or 'review_text' columns.")
 
     # Process Emails
     if 'email_id' in emails.columns and 'body' in emails.columns:
-        for _, e in emails.iterrows():
-            items.append({"id": str(e["email_id"]), "type": "Email", "text": str(e["body"])})
+        items.extend(
+            {"id": eid, "type": "Email", "text": body}
+            for eid, body in zip(emails["email_id"].astype(str), emails["body"].astype(str))
+        )
     else:
         print(" Warning: 'support_emails.csv' missing 'email_id' or 'body' columns.")
 
     print(f" Processing {len(items)} total feedback items...")
 
-    # 3. RUN AGENTS
-    for i, item in enumerate(items):
-        print(f"[{i+1}/{len(items)}] Processing {item['type']} {item['id']}...")
-        result = await process_single_item(item['id'], item['type'], item['text'])
-        
-        ticket = {
-            "ticket_id": f"TKT-{item['id']}",
-            "title": result.get("title", "Untitled"),
-            "category": result.get("category", "Uncategorized"),
-            "priority": result.get("priority", "Low"),
-            "details": json.dumps(result.get("details", {})),
-            "source_id": item['id'],
-            "source_type": item['type']
-        }
-        all_tickets.append(ticket)
+    # 3. CHECK CACHE
+    load_ticket_cache()
+    if semantic_cache:
+        load_embedding_cache()
+        try:
+            await embed_items(items)
+            enable_semantic_cache()
+        except Exception as e:
+            print(f" Warning: embeddings unavailable, using exact-match cache only: {e}")
+
+    # Identical texts in this run only go through the agents once
+    groups = {}
+    for item in items:
+        groups.setdefault(cache_key(item['text']), []).append(item)
+
+    # 4. RUN AGENTS & SAVE RESULTS (each ticket is written as soon as it is ready)
+    tickets_path = OUTPUT_DIR / "generated_tickets.csv"
+    try:
+        if mode == "live" and workers > 1:
+            ticket_count = await run_sharded(list(groups.values()), quality, workers, tickets_path)
+        else:
+            ticket_count = await write_tickets(list(groups.values()), mode, quality, tickets_path)
+    finally:
+        save_ticket_cache()
+        if semantic_cache:
+            save_embedding_cache()
+
+    # Typed columnar copy for the dashboard, details becomes a nested struct column
+    try:
+        df = pd.read_json(OUTPUT_DIR / "generated_tickets.jsonl", lines=True, dtype=False)
+        # pyarrow can't write a struct with no fields, which is what an
+        # all-empty details column turns into, so store it as nulls instead
+        if not df["details"].map(bool).any():
+            df = df.assign(details=None)
+        df.to_parquet(OUTPUT_DIR / "generated_tickets.parquet", index=False, compression="zstd")
+    except Exception as e:
+        print(f" Warning: could not write parquet output: {e}")
 
-    # 4. SAVE RESULTS
-    df = pd.DataFrame(all_tickets)
-    df.to_csv(OUTPUT_DIR / "generated_tickets.csv", index=False)
-    
     # Save Metrics
-    metrics = [{"metric": "total_tickets", "value": len(all_tickets)}]
+    metrics = [{"metric": "total_tickets", "value": ticket_count}]
     pd.DataFrame(metrics).to_csv(OUTPUT_DIR / "metrics.csv", index=False)
     
     # Create log file
     pd.DataFrame(columns=["timestamp", "action"]).to_csv(OUTPUT_DIR / "processing_log.csv", index=False)
 
-    print(f"\n Success! Processed {len(all_tickets)} tickets.")
-    print(f" Output saved to: {OUTPUT_DIR}/generated_tickets.csv")
+    print(f"\n Success! Processed {ticket_count} tickets.")
+    print(f" Output saved to: {OUTPUT_DIR}/generated_tickets.csv and {OUTPUT_DIR}/generated_tickets.jsonl")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Turn feedback CSVs into tickets.")
+    parser.add_argument(
+        "--mode",
+        choices=["live", "batch"],
+        default="live",
+        help="'live' calls the API directly, 'batch' sends one request per item through the OpenAI Batch API (cheaper, up to 24h)."
+    )
+    parser.add_argument(
+        "--quality",
+        action="store_true",
+        help="In live mode, run the full 5-agent team per item instead of a single structured call."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="In live mode, split the items across this many processes (use for 10k+ items)."
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Also reuse tickets of near-duplicate feedback (embedding similarity >= 0.92), not only exact duplicates."
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.mode, args.quality, args.workers, args.semantic_cache))
\ No newline at end of file
@@ -1,47 +1,148 @@
+import os
 import streamlit as st
 import pandas as pd
 import yaml
 import json
 from datetime import datetime
+from pathlib import Path
 import altair as alt
 
 st.set_page_config(page_title="AI Feedback Processing Dashboard", layout="wide")
 
 
+TICKETS_PATH = "outputs/generated_tickets.jsonl"
+
+CATEGORIES = ("Bug", "Feature Request", "Praise", "Complaint", "Spam")
+PRIORITIES = ("Critical", "High", "Medium", "Low")
+# Option -> selectbox index; unknown values (e.g. "Error") fall back to the first option
+CATEGORY_IDX = {c: i for i, c in enumerate(CATEGORIES)}
+PRIORITY_IDX = {p: i for i, p in enumerate(PRIORITIES)}
+
+
 # Utility Functions
-def safe_read_csv(path):
+def to_plain(val):
+    # Parquet returns nested data as numpy arrays and structs padded with None
+    if isinstance(val, dict):
+        return {k: to_plain(v) for k, v in val.items() if v is not None}
+    if hasattr(val, "tolist"):
+        return val.tolist()
+    return val
+
+def safe_read_table(path, columns=None):
+    # Prefer the parquet copy written by main_app.py unless the source file is newer
+    path = Path(path)
+    parquet_path = path.with_suffix(".parquet")
     try:
-        return pd.read_csv(path)
+        if parquet_path.exists() and (
+            not path.exists() or parquet_path.stat().st_mtime >= path.stat().st_mtime
+        ):
+            df = pd.read_parquet(parquet_path, columns=columns)
+            if "details" in df.columns:
+                df["details"] = df["details"].map(lambda v: to_plain(v) or {})
+            return df
+    except:
+        pass
+    try:
+        if path.suffix == ".jsonl":
+            df = pd.read_json(path, lines=True, dtype=False)
+            return df[columns] if columns else df
+        return pd.read_csv(path, usecols=columns)
     except:
         return pd.DataFrame()
 
-def parse_json(val):
+def file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+# Every file version is a new cache key, so bound the caches or each save
+# would keep another full copy of the data in memory. load_table serves six
+# (path, columns) variants per run, the others two, plus room for one older version.
+@st.cache_data(show_spinner=False, max_entries=12)
+def load_table(path, mtimes, columns=None):
+    # mtimes is only part of the cache key, so edits on disk trigger a reload
+    return safe_read_table(path, columns)
+
+def table_mtimes(path):
+    return (file_mtime(path), file_mtime(Path(path).with_suffix(".parquet")))
+
+def read_table(path, columns=None):
+    return load_table(path, table_mtimes(path), columns)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_counts(path, mtimes, column):
+    # One grouped pass per column, recomputed only when the file changes
+    return load_table(path, mtimes, [column]).groupby(column).size()
+
+def read_counts(path, column):
+    return load_counts(path, table_mtimes(path), column)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_count_chart(path, mtimes, column, mark):
+    # Chart on the pre-aggregated counts, so Vega gets a handful of rows
+    # instead of the whole tickets table.
+    counts = load_counts(path, mtimes, column).reset_index(name="count")
+    chart = alt.Chart(counts)
+    if mark == "arc":
+        return chart.mark_arc().encode(theta="count:Q", color=f"{column}:N")
+    return chart.mark_bar().encode(x=f"{column}:N", y="count:Q")
+
+def count_chart(path, column, mark):
+    return load_count_chart(path, table_mtimes(path), column, mark)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_ticket_positions(path, mtimes):
+    # ticket_id -> row position, built once per file version. A resource, not
+    # data, so reruns share the dict instead of unpickling a copy.
+    # Duplicate ids (a review and an email sharing an id) map to the first row.
+    positions = {}
+    for pos, ticket_id in enumerate(load_table(path, mtimes, ["ticket_id"])["ticket_id"]):
+        positions.setdefault(ticket_id, pos)
+    return positions
+
+def ticket_positions(path):
+    return load_ticket_positions(path, table_mtimes(path))
+
+# cache_data rather than cache_resource: the Configuration page edits the
+# returned dict in place, and a shared resource would leak unsaved edits
+# to every other session.
+@st.cache_data(show_spinner=False)
+def load_config(mtime):
     try:
-        return json.loads(val) if isinstance(val, str) else val
+        with open("config.yaml", "r") as f:
+            return yaml.safe_load(f) or {}
     except:
-        return val
+        return {"classification_thresholds": {}, "default_priorities": {}}
 
 def save_config(config):
     with open("config.yaml", "w") as f:
         yaml.dump(config, f)
+    # Don't rely on the mtime alone, it may not change within the same second
+    load_config.clear()
     st.success("Configuration saved!")
 
 def save_tickets(df):
-    df.to_csv("outputs/generated_tickets.csv", index=False)
+    df.to_json(TICKETS_PATH, orient="records", lines=True)
+    try:
+        # An all-empty details column can't be written as a struct, store nulls
+        parquet_df = df if df["details"].map(bool).any() else df.assign(details=None)
+        parquet_df.to_parquet(Path(TICKETS_PATH).with_suffix(".parquet"), index=False, compression="zstd")
+    except:
+        pass
+    # Keep the flat CSV export in sync, with details as JSON text
+    export = df.assign(details=df["details"].map(json.dumps))
+    export.to_csv(Path(TICKETS_PATH).with_suffix(".csv"), index=False)
     st.success("Ticket saved successfully!")
 
 
 # Load Data
-tickets = safe_read_csv("outputs/generated_tickets.csv")
-logs = safe_read_csv("outputs/processing_log.csv")
-metrics = safe_read_csv("outputs/metrics.csv")
+tickets = read_table(TICKETS_PATH)
+logs = read_table("outputs/processing_log.csv")
+metrics = read_table("outputs/metrics.csv")
 
 # Load config
-try:
-    with open("config.yaml", "r") as f:
-        config = yaml.safe_load(f)
-except:
-    config = {"classification_thresholds": {}, "default_priorities": {}}
+config = load_config(file_mtime("config.yaml"))
 
 
 # Sidebar Navigation
@@ -52,6 +153,7 @@ page = st.sidebar.radio(
 )
 
 st.sidebar.markdown("### Outputs")
+st.sidebar.write(" generated_tickets.jsonl")
 st.sidebar.write(" generated_tickets.csv")
 st.sidebar.write(" processing_log.csv")
 st.sidebar.write(" metrics.csv")
@@ -66,21 +168,25 @@ if page == "Dashboard":
         st.warning("No tickets found. Run the processing pipeline first.")
         st.stop()
 
+    # Count each column once and reuse it for the KPIs and charts
+    category_counts = read_counts(TICKETS_PATH, "category")
+    priority_counts = read_counts(TICKETS_PATH, "priority")
+
     # KPIs
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total Tickets", len(tickets))
-    col2.metric("Bug Reports", sum(tickets["category"] == "Bug"))
-    col3.metric("Feature Requests", sum(tickets["category"] == "Feature Request"))
-    col4.metric("Praise", sum(tickets["category"] == "Praise"))
+    col2.metric("Bug Reports", int(category_counts.get("Bug", 0)))
+    col3.metric("Feature Requests", int(category_counts.get("Feature Request", 0)))
+    col4.metric("Praise", int(category_counts.get("Praise", 0)))
 
     st.subheader("Recent Tickets")
     st.dataframe(tickets.tail(10), use_container_width=True)
 
     st.subheader("Category Distribution")
-    st.bar_chart(tickets["category"].value_counts())
+    st.bar_chart(category_counts)
 
     st.subheader("Priority Distribution")
-    st.bar_chart(tickets["priority"].value_counts())
+    st.bar_chart(priority_counts)
 
 
 
@@ -98,8 +204,8 @@ elif page == "Configuration":
     for cat, pr in config.get("default_priorities", {}).items():
         config["default_priorities"][cat] = st.selectbox(
             f"Default Priority for {cat}",
-            ["Critical", "High", "Medium", "Low"],
-            index=["Critical", "High", "Medium", "Low"].index(pr)
+            PRIORITIES,
+            index=PRIORITY_IDX.get(pr, 0)
         )
 
     if st.button("Save Config"):
@@ -115,36 +221,49 @@ elif page == "Manual Override":
         st.warning("No tickets available for editing.")
         st.stop()
 
-    ticket_ids = tickets["ticket_id"].tolist()
-    selected_id = st.selectbox("Select Ticket", ticket_ids)
+    # Cached id -> position map, so lookups and edits don't scan the column
+    positions = ticket_positions(TICKETS_PATH)
+
+    selected_id = st.selectbox("Select Ticket", list(positions))
 
-    ticket = tickets[tickets["ticket_id"] == selected_id].iloc[0]
+    row = positions[selected_id]
+    ticket = tickets.iloc[row]
 
     st.subheader("Edit Ticket")
 
     new_title = st.text_input("Title", ticket["title"])
     new_category = st.selectbox(
         "Category",
-        ["Bug", "Feature Request", "Praise", "Complaint", "Spam"],
-        index=["Bug", "Feature Request", "Praise", "Complaint", "Spam"].index(ticket["category"]),
+        CATEGORIES,
+        index=CATEGORY_IDX.get(ticket["category"], 0),
     )
     new_priority = st.selectbox(
         "Priority",
-        ["Critical", "High", "Medium", "Low"],
-        index=["Critical", "High", "Medium", "Low"].index(ticket["priority"]),
+        PRIORITIES,
+        index=PRIORITY_IDX.get(ticket["priority"], 0),
     )
 
-    new_details = st.text_area("Details (JSON)", ticket["details"], height=200)
+    new_details = st.text_area("Details (JSON)", json.dumps(ticket["details"], indent=2), height=200)
     status = st.radio("Status", ["Pending", "Approved", "Needs Correction"])
 
     if st.button("Save"):
-        idx = tickets[tickets["ticket_id"] == selected_id].index[0]
-
-        tickets.at[idx, "title"] = new_title
-        tickets.at[idx, "category"] = new_category
-        tickets.at[idx, "priority"] = new_priority
-        tickets.at[idx, "details"] = new_details
-        tickets.at[idx, "status"] = status
+        try:
+            details = json.loads(new_details)
+        except json.JSONDecodeError as e:
+            st.error(f"Details must be valid JSON: {e}")
+            st.stop()
+
+        if "status" not in tickets.columns:
+            tickets["status"] = None
+
+        # Positional writes only touch the selected row, and iat stores the
+        # details dict as a single value
+        col = tickets.columns.get_loc
+        tickets.iat[row, col("title")] = new_title
+        tickets.iat[row, col("category")] = new_category
+        tickets.iat[row, col("priority")] = new_priority
+        tickets.iat[row, col("details")] = details
+        tickets.iat[row, col("status")] = status
 
         save_tickets(tickets)
 
@@ -159,19 +278,11 @@ elif page == "Analytics":
         st.stop()
 
     st.subheader("Category Breakdown")
-    chart1 = (
-        alt.Chart(tickets)
-        .mark_bar()
-        .encode(x="category", y="count()")
-    )
+    chart1 = count_chart(TICKETS_PATH, "category", "bar")
     st.altair_chart(chart1, use_container_width=True)
 
     st.subheader("Priority Breakdown")
-    chart2 = (
-        alt.Chart(tickets)
-        .mark_arc()
-        .encode(theta="count():Q", color="priority:N")
-    )
+    chart2 = count_chart(TICKETS_PATH, "priority", "arc")
     st.altair_chart(chart2, use_container_width=True)
 
     if not metrics.empty:
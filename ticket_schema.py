@@ -0,0 +1,45 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ConfigDict
+
+
+# TICKET SCHEMA
+# Shared by the live pipeline (main_app.py) and the batch job (batch_mode.py),
+# so both paths ask for, and validate, exactly the same ticket shape.
+Category = Literal["Bug", "Feature Request", "Praise", "Complaint", "Spam"]
+Priority = Literal["Critical", "High", "Medium", "Low"]
+
+class TicketDetails(BaseModel):
+    # extra="forbid" emits additionalProperties: false, required by strict mode
+    model_config = ConfigDict(extra="forbid")
+
+    steps_to_reproduce: Optional[List[str]]
+    device_info: Optional[str]
+    severity: Optional[str]
+    requested_feature: Optional[str]
+    user_impact: Optional[str]
+
+class TicketOut(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    title: str
+    category: Category
+    priority: Priority
+    details: TicketDetails
+    reasoning: str
+
+
+# SINGLE-PASS PROMPT
+# The five agent roles collapsed into one structured-output request per item.
+SINGLE_PASS_PROMPT = """You are a feedback triage pipeline. For the feedback you receive:
+1. Classify it as ONE of [Bug, Feature Request, Praise, Complaint, Spam]
+   and assign a Priority: [Critical, High, Medium, Low].
+2. IF it is a Bug: extract 'steps_to_reproduce' (list), 'device_info' (if present)
+   and estimate 'severity'.
+3. IF it is a Feature Request: extract 'requested_feature' (concise description)
+   and estimate 'user_impact' (High/Med/Low).
+4. Compile a Jira-style ticket with a clear title and explain the priority.
+Use null for details that do not apply."""
+
+
+def feedback_message(row_id, source_type, text):
+    return f"FEEDBACK (ID: {row_id}, {source_type}): \"{text}\""